@@ -1,43 +1,95 @@
 import random
+from itertools import compress
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback decorator so the kernels below run as plain Python
+        when numba is not installed."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+_rng = random.Random()
+
+# Set to True to print the play-by-play. Off by default: formatting and
+# writing a few lines per card dominates the runtime of headless games.
+VERBOSE = False
+
+
+@njit(cache=True)
+def _playable_mask(suits, lead_suit):
+    """Returns a 0/1 mask over the hand marking the cards that follow
+    lead_suit. Integer-only, like _trick_winner below (pass -1 when
+    there is no lead yet).
+    """
+    return [suit == lead_suit for suit in suits]
+
+
+@njit(cache=True)
+def _trick_winner(suits, keys, trump_suit, lead_suit):
+    """Returns the index of the winning card on the table, given the
+    suits and packed keys of the cards. Trump beats lead suit beats the
+    rest, highest card within a suit wins. Works on plain integers only
+    (pass -1 for no trump), so it stays JIT-compilable.
+    """
+    best = 0
+    best_key = -1
+    for i in range(len(keys)):
+        key = ((suits[i] == trump_suit) << 7 | (suits[i] == lead_suit) << 6
+               | keys[i])
+        if key > best_key:
+            best_key = key
+            best = i
+    return best
 
 
 class Card:
-    """Represents a standard playing card with a rank and a suit."""
-    
+    """Represents a standard playing card with a rank and a suit.
+    The rank and suit are also packed into a single integer key
+    (rank<<2 | suit), so sorting and comparing cards can be done
+    with plain integer compares instead of attribute lookups."""
+
+    __slots__ = ('suit', 'rank', 'key', 'label')
+
     suit_names = ['Clubs', 'Diamonds', 'Hearths', 'Spades']
     rank_names = [None, None, '2', '3', '4', '5', '6', '7',
                   '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace']
-    
+
     def __init__(self, suit=0, rank=2):
         self.suit = suit
         self.rank = rank
+        self.key = rank << 2 | suit
         
     def __str__(self):
-        if self.suit is not None:
-            return '%s of %s' % (Card.rank_names[self.rank],
-                             Card.suit_names[self.suit])
-        else: return 'no trump'
+        return _CARD_STR.get((self.suit, self.rank), 'no trump')
         
     def __lt__(self, other):
-        t1 = self.rank, self.suit
-        t2 = other.rank, other.suit
-        return t1 < t2
+        return self.key < other.key
     
     def has_suit(self, suit):
         return self.suit == suit
-    
-   
+
+
+_CARD_STR = {(suit, rank): '%s of %s' % (Card.rank_names[rank],
+                                         Card.suit_names[suit])
+             for suit in range(4) for rank in range(2, 15)}
+
+_DECK_TEMPLATE = tuple(Card(suit, rank)
+                       for suit in range(4) for rank in range(2, 15))
+
+
 class Deck:
     """Represents a deck of 52 playing cards. Cards can be moved to or
-    from a deck. The deck can also be shuffled or sorted."""
-    
+    from a deck. The deck can also be shuffled or sorted. All decks
+    share the same 52 Card objects, built once at import time."""
+
+    __slots__ = ('cards',)
+
     def __init__(self):
-        self.cards = []
-        for suit in range(4):
-            for rank in range(2, 15):
-                card = Card(suit, rank)
-                self.cards.append(card)
-                
+        self.cards = list(_DECK_TEMPLATE)
+
     def __str__(self):
         res = []
         for card in self.cards:
@@ -45,42 +97,99 @@ class Deck:
         return '\n'.join(res)
     
     def shuffle(self):
-        random.shuffle(self.cards)
+        _rng.shuffle(self.cards)
         
     def sort(self):
-        self.cards.sort()
-            
+        self.cards.sort(key=lambda card: card.key)
+
     def pop_card(self, i=-1):
         return self.cards.pop(i)
-    
+
+    def swap_pop(self, i):
+        """Removes and returns the card at index i in O(1) by swapping
+        it with the last card first. Does not preserve the order of the
+        remaining cards, which is fine: a deck is shuffled before every
+        deal anyway.
+        """
+        cs = self.cards
+        cs[i], cs[-1] = cs[-1], cs[i]
+        return cs.pop()
+
     def add_card(self, card):
         self.cards.append(card)
-        
+
+    def add_cards(self, cards):
+        self.cards.extend(cards)
+
     def move_cards(self, hand, num, i=-1):
         for j in range(num):
             hand.add_card(self.pop_card(i))
-            
+
+    def bulk_move_tail(self, hand, num):
+        """Moves num cards off the top of the deck with two slice
+        operations instead of a pop/append method pair per card. The
+        cards arrive in the same order repeated pop_card calls would
+        produce. Only plain decks and tricks may be the source: a Hand
+        gives up cards one at a time, so its parallel suit list would
+        not be trimmed here.
+        """
+        if not num:
+            return
+        cards = self.cards[:-num - 1:-1]
+        del self.cards[-num:]
+        hand.add_cards(cards)
+
     def move_a_card(self, hand, i =-1):
         self.move_cards(hand, 1, i=-1)
-        
+
+    def move_card_at(self, hand, i):
+        hand.add_card(self.swap_pop(i))
+
     def move_specific_card(self, hand, card):
-        self.move_cards(hand, 1, i = self.cards.index(card))            
+        self.move_card_at(hand, self.cards.index(card))
                 
 
 class Hand(Deck):
     """Represents a hand, is like a deck, but is labeled as the player it
     belongs to. The cards can be seperated on playability."""
-    
+
+    __slots__ = ('label', 'suits', 'playable', 'playable_index',
+                 'unplayable', 'leads')
+
     def __init__(self, label):
         """lists to group the cards in the hand. Lists are re-used.
         self.label (int) is the label of the player the hand belongs to.
-        """ 
+        self.suits mirrors self.cards with just the suit of each card,
+        so suit filters don't need an attribute lookup per card.
+        """
         self.label = label
         self.cards = []
+        self.suits = []
         self.playable = []
+        self.playable_index = []
         self.unplayable = []
         self.leads = []
-        
+
+    def add_card(self, card):
+        self.cards.append(card)
+        self.suits.append(card.suit)
+
+    def add_cards(self, cards):
+        self.cards.extend(cards)
+        self.suits.extend(card.suit for card in cards)
+
+    def pop_card(self, i=-1):
+        self.suits.pop(i)
+        return self.cards.pop(i)
+
+    def swap_pop(self, i):
+        ss = self.suits
+        ss[i], ss[-1] = ss[-1], ss[i]
+        ss.pop()
+        cs = self.cards
+        cs[i], cs[-1] = cs[-1], cs[i]
+        return cs.pop()
+
     def __str__(self):
         res = []
         res.append(str(self.label))
@@ -91,25 +200,35 @@ class Hand(Deck):
     def playability(self, lead_suit):
         """Fills a list with cards that can be played from the hand
         and another list with cards that can't be played.
+        self.playable_index holds each playable card's index in the
+        hand, so a played card can be removed without searching for it.
         """
-        self.leads[:] = self.filter_suit(lead_suit)
-        if self.leads:          
-            self.playable[:] = self.leads[:]
-        else: 
-            self.playable[:] = list( set(self.cards) - set(self.leads) )
-        self.unplayable[:] = list( set(self.cards) - set(self.playable))
-        
+        lead = lead_suit if lead_suit is not None else -1
+        mask = _playable_mask(self.suits, lead)
+        self.leads[:] = compress(self.cards, mask)
+        if self.leads:
+            self.playable[:] = self.leads
+            self.playable_index[:] = compress(range(len(mask)), mask)
+            self.unplayable[:] = compress(self.cards,
+                                          [not m for m in mask])
+        else:
+            self.playable[:] = self.cards
+            self.playable_index[:] = range(len(self.cards))
+            del self.unplayable[:]
+
     
     def filter_suit(self, suit):
         """Returns a list of cards of a certain suit."""
-        return [card for card in self.cards if card.suit == suit]            
+        return list(compress(self.cards, [s == suit for s in self.suits]))
 
 
 class Trick(Deck):
     """Represents the trick that is being played(the cards on the table).
     Is like a deck, but also has a method to find the highest card. 
     It also has a trump suit and a lead suit."""
-    
+
+    __slots__ = ('lead_suit', 'trump_suit', 'label')
+
     def __init__(self):
         """The label corresponds to the player who's turn it is.(int)"""
         self.cards = []
@@ -118,23 +237,24 @@ class Trick(Deck):
         self.label = None
     
     def highest_card(self):
-        self.sort()
-        return self.cards[-1]          
-    
-    def sort(self):
-        """Sorting is done in three steps: (1)based on the __lt__ method
-        of the cards (first rank, then suit), (2)if they have the lead suit
-        and (3)if they have the trump suit.
+        """Finds the winning card by flattening the table to plain
+        integer lists and handing them to the _trick_winner kernel.
         """
-        self.cards.sort()
-        self.cards.sort(key=lambda x: x.has_suit(self.lead_suit))
-        self.cards.sort(key=lambda x: x.has_suit(self.trump_suit))
-   
-    
+        trump = self.trump_suit if self.trump_suit is not None else -1
+        lead = self.lead_suit if self.lead_suit is not None else -1
+        suits = [card.suit for card in self.cards]
+        keys = [card.key for card in self.cards]
+        return self.cards[_trick_winner(suits, keys, trump, lead)]
+
+
+
 class Player:
     """Represents the model player and is not to be confused with the real
     player."""
-    
+
+    __slots__ = ('label', 'name', 'hand', 'played_card', 'played_index',
+                 'tricks_won', 'bids', 'score')
+
     def __init__(self, label, name=''):
         """The label is an integer to identify the player. 
         In fact, all labels being used in the game correspond to the players. 
@@ -146,6 +266,7 @@ class Player:
         self.name = name
         self.hand = Hand(self.label)
         self.played_card = None
+        self.played_index = None
         self.tricks_won = 0
         self.bids = 0
         self.score = 0
@@ -156,14 +277,19 @@ class Player:
         for now, to check if the model works, players play a random playable card.
         """
         self.hand.playability(lead_suit)
-        self.played_card = random.choice(self.hand.playable)
+        choice = _rng.randrange(len(self.hand.playable))
+        self.played_card = self.hand.playable[choice]
+        self.played_index = self.hand.playable_index[choice]
         self.played_card.label = self.label
         
-        for card in self.hand.playable:
-            print(str(card) + ' playable')
-        for card in self.hand.unplayable:
-            print(str(card) + ' unplayable')
-        print('\n{} played\n'.format(self.played_card))
+        if VERBOSE:
+            if self.hand.playable:
+                print('\n'.join(str(card) + ' playable'
+                                for card in self.hand.playable))
+            if self.hand.unplayable:
+                print('\n'.join(str(card) + ' unplayable'
+                                for card in self.hand.unplayable))
+            print('\n{} played\n'.format(self.played_card))
        
             
 class Score:
@@ -207,16 +333,17 @@ class Game:
         by giving all players a card. Highest card wins.
         """
         self.deck.shuffle()
-        self.deck.move_cards(self.trick, Game.nop)
-        ranked = sorted( enumerate(self.trick.cards), key=lambda x : x[1] )
-        self.trick.move_cards(self.deck, Game.nop)
-        return ranked[-1][0] 
+        self.deck.bulk_move_tail(self.trick, Game.nop)
+        winner = max(range(Game.nop), key=lambda i: self.trick.cards[i].key)
+        self.trick.bulk_move_tail(self.deck, Game.nop)
+        return winner
     
     def next_player(self, label):
         """Returns the next player given the label of the last
-        player. Sets the label of the trick accordingly.
+        player, wrapping around with a bitmask (the number of players
+        is a power of two). Sets the label of the trick accordingly.
         """
-        player = self.players[label - (self.nop - 1)]
+        player = self.players[(label + 1) & _NOP_MASK]
         self.trick.label = player.label
         return player
         
@@ -229,28 +356,33 @@ class Game:
         self.label = player.label
     
     def pull_trump(self):
-        """Every even round there is a random trump suit. 
-        Trump cards always win from cards with the leading suit.
+        """Shuffles the deck for the round. Every even round there is
+        a random trump suit, drawn directly from the generator. That is
+        distributionally the same as peeking a card from the shuffled
+        deck and reshuffling, without pinning down where the peeked
+        card gets dealt. Trump cards always win from cards with the
+        leading suit.
         """
+        self.deck.shuffle()
         if self.round % 2 == 0 :
-            self.trick.trump_suit = self.deck.cards[-1].suit
-            self.deck.shuffle()
+            self.trick.trump_suit = _rng.randrange(4)
         else: self.trick.trump_suit = None
-        if self.trick.trump_suit:
-            print('trump is' + Card.suit_names[self.trick.trump_suit])    
+        if VERBOSE and self.trick.trump_suit:
+            print('trump is' + Card.suit_names[self.trick.trump_suit])
     
     def deal_hands(self):
         """Deals a number of cards from the deck to all hands in the game.
         """
         for player in self.players:
-            self.deck.move_cards(player.hand, self.noc[self.round - 1])
+            self.deck.bulk_move_tail(player.hand, self.noc[self.round - 1])
             
     def leading_player(self):
         """Determines the next leading player at the end of a trick. 
         Sets the label of the trick accordingly.
         """
         card = self.trick.highest_card()
-        print('highest card is ' + str(card)) 
+        if VERBOSE:
+            print('highest card is ' + str(card))
         player = self.players[card.label]
         self.trick.label = player.label
         return player
@@ -262,42 +394,56 @@ class Game:
         player = self.leading_player()
         player.tricks_won += 1
         self.trick.lead_suit = None
-        self.trick.move_cards(self.deck, self.nop)
+        self.trick.bulk_move_tail(self.deck, self.nop)
         
     def play(self):
-        """The main mechanics of the game. It loops as long as someone still
-        holds cards. Players play clockwise. If the trick has as many cards in it 
-        as there are players, it is complete. The next leading player is decided with
-        the highest card. 
+        """The main mechanics of the game. It loops as long as cards are
+        left this round, counting them down as they are played. Players
+        play clockwise; the trick's label directly indexes the player
+        whose turn it is. If the trick has as many cards in it as there
+        are players, it is complete. The next leading player is decided with
+        the highest card. The per-round state is bound to locals, which
+        keeps the inner loop free of attribute chains (and trivially
+        specializable by PyPy's JIT; the module runs unchanged on both
+        CPython and PyPy).
         """
-        while any(player.hand.cards for player in self.players):  
-            
-            for player in self.players:
-                if player.label == self.trick.label:
-                    player.start(self.trick.lead_suit)
-                    card = player.played_card
-                    player.hand.move_specific_card(self.trick, card)
-            
-            if len(self.trick.cards) == 1:
-                self.trick.lead_suit = card.suit        
-            if len(self.trick.cards) == self.nop:
+        trick = self.trick
+        trick_cards = trick.cards
+        players = self.players
+        nop = self.nop
+        cards_left = self.noc[self.round - 1] * nop
+        while cards_left:
+
+            player = players[trick.label]
+            player.start(trick.lead_suit)
+            card = player.played_card
+            player.hand.move_card_at(trick, player.played_index)
+            cards_left -= 1
+
+            if len(trick_cards) == 1:
+                trick.lead_suit = card.suit
+            if len(trick_cards) == nop:
                 self.trick_complete()
             else:
-                self.next_player(self.trick.label)
+                self.next_player(trick.label)
                 
     def run(self):
         """The main loop of the game model, each loop is a round in the game. 
         """
         while self.round <= len(self.noc):
-             print('\nround ' + str(self.round))
+             if VERBOSE:
+                 print('\nround ' + str(self.round))
              self.starting_player()
-             self.deck.shuffle()
              self.pull_trump()
              self.deal_hands()
              self.play()
              self.score.adjust()
-             self.round += 1  
-             
+             self.round += 1
+
+
+_NOP_MASK = Game.nop - 1
+
+
 def main():
    
     game = Game()